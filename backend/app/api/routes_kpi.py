@@ -1,74 +1,149 @@
-from fastapi import APIRouter, Depends
+import os
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..graphs.kpi_graph import create_kpi_graph
+from ..core.db import get_session
+from ..graphs.kpi_graph import run_kpi_graph, KPI_MODEL, NARRATIVE_MODEL
+from ..models.dashboard import Dashboard, DashboardRollup
+from ..models.schedule import ScheduledDashboard
 from ..models.viz import VisualizationSpec
+from ..services.request_coalescer import RequestCoalescer
+from ..services.llm_client import get_model_options
+from ..services.rollup_service import RollupEngine
+from ..services.precompute_service import fetch_file_url, find_precomputed, freshness, source_hash
 
 router = APIRouter()
 
+# Identical concurrent requests share a single graph run (and a single Dashboard row).
+coalescer = RequestCoalescer()
+
 class KPIRequest(BaseModel):
     file_url: Optional[str] = None
     csv_content: Optional[str] = None
     context: Optional[str] = None
 
+class Freshness(BaseModel):
+    schedule_id: int
+    generated_at: datetime
+    age_seconds: float
+    stale: bool
+
 class KPIResponse(BaseModel):
     status: str
     message: str
     kpis: List[Dict[str, Any]]
     visualizations: List[VisualizationSpec]
     narrative: str
+    dashboard_id: Optional[int] = None
+    # Reason the dashboard has no drill-down rollups (and breakdown charts), if building them failed
+    rollups_error: Optional[str] = None
+    # Set when the response is served from a scheduled precomputation
+    precomputed: bool = False
+    freshness: Optional[Freshness] = None
+
+def precomputed_response(schedule: ScheduledDashboard, dashboard: Dashboard) -> KPIResponse:
+    data = dashboard.data or {}
+    return KPIResponse(
+        status="completed",
+        message="Dashboard served from scheduled precomputation",
+        kpis=data.get("kpis", []),
+        visualizations=data.get("visualizations", []),
+        narrative=data.get("narrative", ""),
+        dashboard_id=dashboard.id,
+        rollups_error=data.get("rollups_error"),
+        precomputed=True,
+        freshness=Freshness(**freshness(schedule, dashboard)),
+    )
+
+class RollupSliceResponse(BaseModel):
+    dashboard_id: int
+    grain: Optional[str]
+    dimensions: List[str]
+    rows: List[Dict[str, Any]]
 
 @router.post("/", response_model=KPIResponse)
-async def generate_kpi_dashboard(req: KPIRequest):
-    # Parse CSV content
-    schema_str = "N/A"
-    data_summary = "N/A"
-    sample_data = []
-    
-    if req.csv_content:
+async def generate_kpi_dashboard(req: KPIRequest, session: AsyncSession = Depends(get_session)):
+    csv_content = req.csv_content
+    if not csv_content and req.file_url:
         try:
-            import pandas as pd
-            import io
-            
-            df = pd.read_csv(io.StringIO(req.csv_content))
-            
-            # Generate schema string
-            buffer = io.StringIO()
-            df.info(buf=buffer)
-            schema_str = buffer.getvalue()
-            
-            # Generate data summary
-            data_summary = df.describe().to_string()
-            
-            # Get sample data (up to 100 rows for anomaly detection)
-            sample_data = df.head(100).to_dict(orient="records")
-            
-        except Exception as e:
-            print(f"Error parsing CSV: {e}")
-            schema_str = f"Error parsing CSV: {e}"
-
-    # Initialize graph input state
-    initial_state = {
-        "context": req.context or "",
-        "schema": schema_str,
-        "data_summary": data_summary,
-        "sample_data": sample_data,
-        "kpis": [],
-        "visualizations": [],
-        "narrative": ""
-    }
-    
-    # Run the graph
-    app = create_kpi_graph()
-    # ainvoke returns the final state
-    final_state = await app.ainvoke(initial_state)
-    
+            csv_content = await fetch_file_url(req.file_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Could not fetch file_url: {e}")
+
+    # Data that a schedule has already precomputed (same content and context) is a DB read.
+    content_hash = source_hash(csv_content) if csv_content else None
+    if content_hash:
+        match = await find_precomputed(session, content_hash, req.context or "")
+        if match is not None:
+            return precomputed_response(*match)
+
+    key = RequestCoalescer.make_key(
+        content_hash,
+        req.context,
+        {
+            "kpi_model": KPI_MODEL,
+            "narrative_model": NARRATIVE_MODEL,
+            # Runtime options (temperature, num_predict, num_ctx, ...) change the output too
+            "kpi_options": get_model_options(KPI_MODEL),
+            "narrative_options": get_model_options(NARRATIVE_MODEL),
+            "base_url": os.getenv("OLLAMA_BASE_URL", "https://ollama.linux-box"),
+        },
+    )
+    final_state = await coalescer.run(key, lambda: run_kpi_graph(csv_content, req.context))
+
     return KPIResponse(
         status="completed",
         message="Dashboard generated successfully via LangGraph",
         kpis=final_state["kpis"],
         visualizations=final_state["visualizations"],
-        narrative=final_state["narrative"]
+        narrative=final_state["narrative"],
+        dashboard_id=final_state.get("dashboard_id"),
+        rollups_error=final_state.get("rollups_error"),
     )
 
+@router.get("/coalescing")
+async def get_coalescing_stats():
+    return coalescer.stats()
+
+@router.get("/dashboards/{dashboard_id}/rollups", response_model=RollupSliceResponse)
+async def get_rollup_slice(
+    dashboard_id: int,
+    grain: Optional[str] = None,
+    dimension: List[str] = Query([]),
+    filter: List[str] = Query([], description="Filters as column=value; period=<bucket> filters the grain"),
+    measure: Optional[str] = None,
+    aggregation: str = "sum",
+    session: AsyncSession = Depends(get_session),
+):
+    """Serves a drill-down slice from the rollups stored with the dashboard (no raw data access)."""
+    rollup = await session.get(DashboardRollup, dashboard_id)
+    if rollup is None:
+        raise HTTPException(status_code=404, detail="No rollups for this dashboard")
+
+    filters = {}
+    for item in filter:
+        column, sep, value = item.partition("=")
+        if not sep:
+            raise HTTPException(status_code=400, detail=f"Invalid filter '{item}', expected column=value")
+        filters[column] = value
+
+    rollups = rollup.data or {}
+    engine = RollupEngine()
+    try:
+        _, dimension_filters = engine.split_filters(rollups, grain, filters)
+        rows = engine.slice(rollups, grain, dimension, filters, measure, aggregation)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+    return RollupSliceResponse(
+        dashboard_id=dashboard_id,
+        grain=grain,
+        dimensions=sorted(set(dimension) | set(dimension_filters)),
+        rows=rows,
+    )
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from typing import Optional, List
+from sqlmodel import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.db import get_session
+from ..models.dashboard import Dashboard
+from ..models.schedule import ScheduledDashboard
+from ..services.precompute_service import (
+    ScheduleAlreadyRunning,
+    precompute_scheduler,
+    resolve_source_path,
+    validate_file_url,
+)
+from .routes_kpi import KPIResponse, precomputed_response
+
+router = APIRouter()
+
+class ScheduleRequest(BaseModel):
+    name: str
+    file_url: Optional[str] = None
+    source_path: Optional[str] = None
+    context: str = ""
+    cadence_minutes: int = 24 * 60
+    enabled: bool = True
+
+async def _get_schedule(session: AsyncSession, schedule_id: int) -> ScheduledDashboard:
+    schedule = await session.get(ScheduledDashboard, schedule_id)
+    if schedule is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return schedule
+
+@router.post("/", response_model=ScheduledDashboard)
+async def create_schedule(req: ScheduleRequest, session: AsyncSession = Depends(get_session)):
+    if bool(req.file_url) == bool(req.source_path):
+        raise HTTPException(status_code=400, detail="Provide exactly one of file_url or source_path")
+    if req.cadence_minutes <= 0:
+        raise HTTPException(status_code=400, detail="cadence_minutes must be positive")
+    try:
+        if req.source_path:
+            resolve_source_path(req.source_path)
+        else:
+            validate_file_url(req.file_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    schedule = ScheduledDashboard(**req.dict())
+    session.add(schedule)
+    await session.commit()
+    await session.refresh(schedule)
+    return schedule
+
+@router.get("/", response_model=List[ScheduledDashboard])
+async def list_schedules(session: AsyncSession = Depends(get_session)):
+    return (await session.execute(select(ScheduledDashboard))).scalars().all()
+
+@router.delete("/{schedule_id}")
+async def delete_schedule(schedule_id: int, session: AsyncSession = Depends(get_session)):
+    schedule = await _get_schedule(session, schedule_id)
+    await session.delete(schedule)
+    await session.commit()
+    return {"deleted": schedule_id}
+
+@router.post("/{schedule_id}/run", response_model=KPIResponse)
+async def run_schedule_now(schedule_id: int, session: AsyncSession = Depends(get_session)):
+    """Regenerates a schedule immediately (e.g. to seed it) instead of waiting for off-peak."""
+    schedule = await _get_schedule(session, schedule_id)
+    try:
+        dashboard_id = await precompute_scheduler.run_schedule(schedule_id)
+    except ScheduleAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if dashboard_id is None:
+        await session.refresh(schedule)
+        raise HTTPException(status_code=502, detail=f"Precompute run failed: {schedule.last_error}")
+    return await get_latest(schedule_id, session)
+
+@router.get("/{schedule_id}/latest", response_model=KPIResponse)
+async def get_latest(schedule_id: int, session: AsyncSession = Depends(get_session)):
+    schedule = await _get_schedule(session, schedule_id)
+    # Re-read in case a background run updated the schedule since this session loaded it
+    await session.refresh(schedule)
+    if schedule.last_dashboard_id is None:
+        detail = schedule.last_error or "Schedule has not produced a dashboard yet"
+        raise HTTPException(status_code=404, detail=detail)
+    dashboard = await session.get(Dashboard, schedule.last_dashboard_id)
+    if dashboard is None:
+        raise HTTPException(status_code=404, detail="Precomputed dashboard not found")
+    return precomputed_response(schedule, dashboard)
@@ -2,8 +2,6 @@ import os
 from sqlmodel import SQLModel, create_engine
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-import chromadb
-from chromadb.config import Settings as ChromaSettings
 
 # Database Setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./metricmind.db")
@@ -25,10 +23,15 @@ async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
 
-# Chroma Setup
+# Chroma Setup (optional vector store backend, created on first use)
 CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
-chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
-collection = chroma_client.get_or_create_collection(name="dashboards")
+collection = None
 
 def get_chroma_collection():
+    global collection
+    if collection is None:
+        import chromadb
+
+        chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+        collection = chroma_client.get_or_create_collection(name="dashboards")
     return collection
@@ -1,12 +1,21 @@
-from typing import TypedDict, List, Dict, Any
+import asyncio
+import logging
+import os
+from typing import TypedDict, List, Dict, Any, Optional
 from langgraph.graph import StateGraph, END
 
 from ..services.llm_client import LLMClient
 from ..services.kpi_agent import KPIExtractionAgent
 from ..services.viz_agent import VisualizationAgent
 from ..services.narrative_agent import NarrativeAgent
+from ..services.rollup_service import RollupEngine
 from ..models.viz import VisualizationSpec
 
+KPI_MODEL = os.getenv("KPI_MODEL", "qwen2.5-coder:3b")
+NARRATIVE_MODEL = os.getenv("NARRATIVE_MODEL", "llama3.2:3b")
+
+logger = logging.getLogger(__name__)
+
 class GraphState(TypedDict):
     context: str
     schema: str
@@ -16,17 +25,21 @@ class GraphState(TypedDict):
     narrative: str
     data_summary: str
     sample_data: List[Dict[str, Any]]
+    rollups: Dict[str, Any]
+    # Why drill-down rollups are missing, if building them failed
+    rollups_error: Optional[str]
+    dashboard_id: Optional[int]
 
 async def node_extract_kpis(state: GraphState):
     # Using qwen2.5-coder:3b for KPI extraction (code generation capabilities)
-    llm_client = LLMClient(model="qwen2.5-coder:3b")
+    llm_client = LLMClient(model=KPI_MODEL)
     agent = KPIExtractionAgent(llm_client)
     kpis = await agent.run(state["schema"], state["context"], state.get("data_summary", ""))
     return {"kpis": kpis}
 
 def node_visualize(state: GraphState):
     agent = VisualizationAgent()
-    specs = agent.run(state["kpis"], state["schema"], state.get("sample_data", []))
+    specs = agent.run(state["kpis"], state["schema"], state.get("sample_data", []), state.get("rollups"))
     return {"visualizations": specs}
 
 from ..services.anomaly_service import AnomalyService
@@ -62,13 +75,13 @@ def node_detect_anomalies(state: GraphState):
 
 async def node_narrate(state: GraphState):
     # Using llama3.2:3b for narrative generation
-    llm_client = LLMClient(model="llama3.2:3b")
+    llm_client = LLMClient(model=NARRATIVE_MODEL)
     agent = NarrativeAgent(llm_client)
     narrative = await agent.run(state["kpis"], state["context"], state.get("anomalies"))
     return {"narrative": narrative}
 
 from app.core.db import engine, init_db
-from app.models.dashboard import Dashboard
+from app.models.dashboard import Dashboard, DashboardRollup
 from app.services.rag_service import RAGService
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic.json import pydantic_encoder
@@ -86,6 +99,7 @@ async def node_persist(state: GraphState):
                 "kpis": state["kpis"],
                 "visualizations": safe_visualizations,
                 "narrative": state["narrative"],
+                "rollups_error": state.get("rollups_error"),
             },
         )
         session.add(dashboard)
@@ -93,6 +107,10 @@ async def node_persist(state: GraphState):
         await session.refresh(dashboard)
         dashboard_id = dashboard.id
 
+        if state.get("rollups"):
+            session.add(DashboardRollup(dashboard_id=dashboard_id, data=state["rollups"]))
+            await session.commit()
+
     # 2. Save to RAG (Chroma)
     rag = RAGService()
     rag.add_dashboard(
@@ -125,3 +143,61 @@ def create_kpi_graph():
 # Backwards-compatible alias for tests expecting build_kpi_graph
 def build_kpi_graph():
     return create_kpi_graph()
+
+async def run_kpi_graph(csv_content: Optional[str] = None, context: Optional[str] = None) -> Dict[str, Any]:
+    """Parses CSV content into the graph input state and runs the full pipeline."""
+    # Parse CSV content
+    schema_str = "N/A"
+    data_summary = "N/A"
+    sample_data = []
+    rollups = {}
+    rollups_error = None
+    
+    if csv_content:
+        try:
+            import pandas as pd
+            import io
+            
+            df = pd.read_csv(io.StringIO(csv_content))
+            
+            # Generate schema string
+            buffer = io.StringIO()
+            df.info(buf=buffer)
+            schema_str = buffer.getvalue()
+            
+            # Generate data summary
+            data_summary = df.describe().to_string()
+            
+            # Get sample data (up to 100 rows for anomaly detection)
+            sample_data = df.head(100).to_dict(orient="records")
+
+            # Precompute drill-down aggregates over the full dataset, off the event loop
+            try:
+                loop = asyncio.get_running_loop()
+                rollups = await loop.run_in_executor(None, RollupEngine().build, df)
+            except Exception as e:
+                logger.exception("Error building rollups")
+                rollups_error = f"Error building rollups: {e}"
+            
+        except Exception as e:
+            print(f"Error parsing CSV: {e}")
+            schema_str = f"Error parsing CSV: {e}"
+
+    # Initialize graph input state
+    initial_state = {
+        "context": context or "",
+        "schema": schema_str,
+        "data_summary": data_summary,
+        "sample_data": sample_data,
+        "rollups": rollups,
+        "rollups_error": rollups_error,
+        "kpis": [],
+        "visualizations": [],
+        "narrative": ""
+    }
+    
+    # Run the graph
+    app = create_kpi_graph()
+    # ainvoke returns the final state
+    return await app.ainvoke(initial_state)
+
@@ -1,14 +1,38 @@
+import asyncio
+import os
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes_kpi import router as kpi_router
+from app.api.routes_kpi import router as kpi_router, coalescer as kpi_coalescer
+from app.api.routes_schedules import router as schedules_router
 
 from app.core.db import init_db
+from app.services.llm_client import LLMClient
+from app.services.precompute_service import precompute_scheduler
 from contextlib import asynccontextmanager
 
+logger = logging.getLogger(__name__)
+
+async def preload_models():
+    # Comma-separated list, e.g. "qwen2.5-coder:3b,llama3.2:3b"
+    models = [m.strip() for m in os.getenv("OLLAMA_PRELOAD_MODELS", "").split(",") if m.strip()]
+    for model in models:
+        try:
+            await LLMClient(model=model).preload()
+        except Exception as e:
+            logger.warning("Failed to preload model %s: %s", model, e)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    # Loading models can take minutes (or time out if Ollama is down); don't hold up startup.
+    preload_task = asyncio.create_task(preload_models())
+    if os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true":
+        # Scheduled runs yield to interactive /kpi requests that are in flight
+        precompute_scheduler.start(is_busy=lambda: kpi_coalescer.stats()["in_flight"] > 0)
     yield
+    preload_task.cancel()
+    await precompute_scheduler.stop()
 
 app = FastAPI(title="MetricMind API", lifespan=lifespan)
 
@@ -21,3 +45,4 @@ app.add_middleware(
 )
 
 app.include_router(kpi_router, prefix="/kpi", tags=["kpi"])
+app.include_router(schedules_router, prefix="/schedules", tags=["schedules"])
@@ -9,3 +9,9 @@ class Dashboard(SQLModel, table=True):
     
     # Store the full JSON response (KPIs, Viz, Narrative)
     data: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+
+class DashboardRollup(SQLModel, table=True):
+    # Drill-down aggregates live in their own row so loading a Dashboard stays cheap
+    dashboard_id: int = Field(primary_key=True, foreign_key="dashboard.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    data: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
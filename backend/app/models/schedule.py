@@ -0,0 +1,26 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+class ScheduledDashboard(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str
+    # Exactly one source: a remote CSV URL or a file under PRECOMPUTE_SOURCE_DIR
+    file_url: Optional[str] = None
+    source_path: Optional[str] = None
+    context: str = ""
+    cadence_minutes: int = 24 * 60
+    enabled: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    # Scheduled slot of the last successful run; the next run is due one cadence later.
+    # Anchoring to the slot (not the completion time) keeps daily runs from drifting.
+    last_run_at: Optional[datetime] = None
+    # Most recent attempt, successful or not, and failed attempts since the last success
+    last_attempt_at: Optional[datetime] = None
+    failure_count: int = 0
+    last_dashboard_id: Optional[int] = Field(default=None, foreign_key="dashboard.id")
+    # Hash of the CSV content used for that run; requests with the same content are served from it
+    last_source_hash: Optional[str] = Field(default=None, index=True)
+    # Outcome of the most recent attempt
+    last_error: Optional[str] = None
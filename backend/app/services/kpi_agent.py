@@ -16,18 +16,24 @@ class KPIExtractionAgent:
     def __init__(self, llm_client: LLMClient):
         self.llm = llm_client
 
+    # Static instructions go in the system message so the prompt prefix is identical across requests.
+    SYSTEM_PROMPT = (
+        "You are a data analyst. Given a DataFrame schema, "
+        "return a JSON array of KPI objects with the fields: name, description, "
+        "formula (as a Python expression using the column names), value (extract or estimate from summary if possible, else 'N/A'), and display_format. "
+        "Only include KPIs that reference existing columns."
+    )
+
     async def run(self, schema: str, context: str = "", data_summary: str = "") -> List[Dict]:
-        prompt = f"You are a data analyst. Given the following DataFrame schema:\n{schema}\n"
+        prompt = f"DataFrame schema:\n{schema}\n"
         if data_summary:
             prompt += f"Data Summary (Statistics):\n{data_summary}\n"
         if context:
             prompt += f"Business context: {context}\n"
-        prompt += (
-            "Return a JSON array of KPI objects with the fields: name, description, "
-            "formula (as a Python expression using the column names), value (extract or estimate from summary if possible, else 'N/A'), and display_format. "
-            "Only include KPIs that reference existing columns."
-        )
-        messages = [{"role": "user", "content": prompt}]
+        messages = [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
         response = await self.llm.chat(messages)
 
         cleaned_response = response.strip()
@@ -1,6 +1,140 @@
+import asyncio
+import json
+import logging
 import os
 import httpx
-from typing import List, Dict
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sent as the leading system text of every chat so Ollama can reuse the cached prompt prefix.
+SHARED_SYSTEM_PROMPT = (
+    "You are MetricMind, an analytics assistant that turns tabular business data "
+    "into KPI dashboards. Be precise and respond only with what is asked."
+)
+
+# Per-model runtime options. `keep_alive` is a top-level request field; everything else
+# is passed through as Ollama `options` (num_ctx, num_predict, num_thread, temperature, ...).
+DEFAULT_MODEL_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "qwen2.5-coder:3b": {"keep_alive": "30m", "num_ctx": 8192, "num_predict": 1024, "temperature": 0.1},
+    "llama3.2:3b": {"keep_alive": "30m", "num_ctx": 4096, "num_predict": 512, "temperature": 0.4},
+}
+
+
+def parse_model_option_overrides(raw: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Parses OLLAMA_MODEL_OPTIONS: a JSON object keyed by model name ("*" applies to every
+    model) whose values are option objects. Invalid input is logged and ignored, entry by
+    entry, so one bad value cannot break every LLM call.
+    """
+    if not raw:
+        return {}
+    try:
+        overrides = json.loads(raw)
+    except json.JSONDecodeError:
+        logger.error("Ignoring invalid OLLAMA_MODEL_OPTIONS: %s", raw[:200])
+        return {}
+    if not isinstance(overrides, dict):
+        logger.error("Ignoring OLLAMA_MODEL_OPTIONS, expected a JSON object: %s", raw[:200])
+        return {}
+
+    valid: Dict[str, Dict[str, Any]] = {}
+    for model, options in overrides.items():
+        if isinstance(options, dict):
+            valid[model] = options
+        else:
+            logger.error("Ignoring OLLAMA_MODEL_OPTIONS[%r], expected a JSON object", model)
+    return valid
+
+
+# Parsed once at import; get_model_options runs on every chat and /kpi request.
+MODEL_OPTION_OVERRIDES = parse_model_option_overrides(os.getenv("OLLAMA_MODEL_OPTIONS"))
+
+
+def get_model_options(model: str) -> Dict[str, Any]:
+    """Merges the built-in options for `model` with overrides from OLLAMA_MODEL_OPTIONS."""
+    options: Dict[str, Any] = {"keep_alive": os.getenv("OLLAMA_KEEP_ALIVE", "30m")}
+    options.update(DEFAULT_MODEL_OPTIONS.get(model, {}))
+    options.update(MODEL_OPTION_OVERRIDES.get("*", {}))
+    options.update(MODEL_OPTION_OVERRIDES.get(model, {}))
+    return options
+
+
+def scheduler_enabled() -> bool:
+    """OLLAMA_SCHEDULER is "on", "off" or "auto" (default): on unless the host keeps
+    several models loaded at once (OLLAMA_MAX_LOADED_MODELS > 1)."""
+    mode = os.getenv("OLLAMA_SCHEDULER", "auto").lower()
+    if mode in ("on", "off"):
+        return mode == "on"
+    return int(os.getenv("OLLAMA_MAX_LOADED_MODELS", "1")) <= 1
+
+
+class ModelScheduler:
+    """Groups LLM calls by model so a memory-constrained Ollama host is not forced to
+    swap models back and forth. Calls for the active model run concurrently; calls for
+    another model queue first-come-first-served. When the active batch drains, the model
+    at the head of the queue goes next, together with its other queued calls. New calls
+    do not join the active model while anything is queued, so no model waits forever.
+    """
+
+    def __init__(self, enabled: bool = None):
+        self.enabled = scheduler_enabled() if enabled is None else enabled
+        self.active_model: str = None
+        self.active_count = 0
+        self._queue: List[Tuple[str, asyncio.Future]] = []
+        self.model_switches = 0
+
+    async def acquire(self, model: str):
+        if not self.enabled:
+            return
+        self._queue = [(m, f) for m, f in self._queue if not f.done()]
+        if not self._queue and (self.active_count == 0 or self.active_model == model):
+            self._activate(model)
+            self.active_count += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.append((model, fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if (model, fut) in self._queue:
+                self._queue.remove((model, fut))
+            elif not fut.cancelled():
+                # Woken and counted as active before the cancellation landed.
+                self.release(model)
+            raise
+
+    def release(self, model: str):
+        if not self.enabled:
+            return
+        self.active_count = max(self.active_count - 1, 0)
+        while self.active_count == 0:
+            self._queue = [(m, f) for m, f in self._queue if not f.done()]
+            if not self._queue:
+                return
+            next_model = self._queue[0][0]
+            self._activate(next_model)
+            remaining = []
+            for m, fut in self._queue:
+                if m != next_model:
+                    remaining.append((m, fut))
+                    continue
+                try:
+                    fut.set_result(None)
+                    self.active_count += 1
+                except RuntimeError:
+                    # Future belongs to an event loop that has since closed.
+                    pass
+            self._queue = remaining
+
+    def _activate(self, model: str):
+        if self.active_model is not None and self.active_model != model:
+            self.model_switches += 1
+        self.active_model = model
+
+
+scheduler = ModelScheduler()
+
 
 class LLMClient:
     """Simple Ollama HTTP client.
@@ -11,8 +145,40 @@ class LLMClient:
         self.model = model or os.getenv("OLLAMA_MODEL", "qwen2.5-coder:3b")
         self.client = httpx.AsyncClient(base_url=self.base_url, verify=False, timeout=120.0)
 
+    def build_payload(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        options = get_model_options(self.model)
+        keep_alive = options.pop("keep_alive", None)
+
+        if messages and messages[0].get("role") == "system":
+            system = {"role": "system", "content": f"{SHARED_SYSTEM_PROMPT}\n\n{messages[0]['content']}"}
+            messages = [system] + list(messages[1:])
+        else:
+            messages = [{"role": "system", "content": SHARED_SYSTEM_PROMPT}] + list(messages)
+
+        payload = {"model": self.model, "messages": messages, "stream": False, "options": options}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+
     async def chat(self, messages: List[Dict[str, str]]) -> str:
-        payload = {"model": self.model, "messages": messages, "stream": False}
-        resp = await self.client.post("/api/chat", json=payload)
+        payload = self.build_payload(messages)
+        await scheduler.acquire(self.model)
+        try:
+            resp = await self.client.post("/api/chat", json=payload)
+        finally:
+            scheduler.release(self.model)
         resp.raise_for_status()
         return resp.json()["message"]["content"]
+
+    async def preload(self):
+        """Loads the model into memory (with its keep_alive) without generating anything."""
+        payload = {"model": self.model}
+        keep_alive = get_model_options(self.model).get("keep_alive")
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        await scheduler.acquire(self.model)
+        try:
+            resp = await self.client.post("/api/generate", json=payload)
+        finally:
+            scheduler.release(self.model)
+        resp.raise_for_status()
@@ -4,6 +4,8 @@ class NarrativeAgent:
     """
     Generates a text summary using Llama 3.
     """
+    SYSTEM_PROMPT = "Write a concise executive summary (1 paragraph) analyzing the KPIs you are given."
+
     def __init__(self, llm_client: LLMClient):
         self.llm = llm_client
 
@@ -12,9 +14,11 @@ class NarrativeAgent:
         prompt = (
             f"Context: {context}\n"
             f"KPI Data: {kpis}{anomalies_text}\n"
-            "Write a concise executive summary (1 paragraph) analyzing these KPIs."
         )
-        messages = [{"role": "user", "content": prompt}]
+        messages = [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
         # Use a different model if needed, e.g. self.llm.model = "llama3:8b"
         # For now assuming the client handles model switching or we instantiate a new client.
         return await self.llm.chat(messages)
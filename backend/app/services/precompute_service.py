@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Dict, Any
+from urllib.parse import urlparse
+
+import httpx
+from sqlmodel import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import engine
+from app.graphs.kpi_graph import run_kpi_graph
+from app.models.dashboard import Dashboard
+from app.models.schedule import ScheduledDashboard
+
+logger = logging.getLogger(__name__)
+
+
+def parse_hour_ranges(spec: str) -> List[Tuple[int, int]]:
+    """Parses "0-6,22-24" into [(0, 6), (22, 24)]. A range such as "22-6" wraps past midnight."""
+    ranges = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        start, _, end = part.partition("-")
+        ranges.append((int(start), int(end or int(start) + 1)))
+    return ranges
+
+
+def resolve_source_path(source_path: str) -> Path:
+    """Resolves a schedule's source_path inside PRECOMPUTE_SOURCE_DIR, rejecting paths that escape it."""
+    base = Path(os.getenv("PRECOMPUTE_SOURCE_DIR", "./data")).resolve()
+    path = (base / source_path).resolve()
+    if base not in path.parents:
+        raise ValueError(f"source_path must be inside {base}")
+    return path
+
+
+def validate_file_url(file_url: str) -> str:
+    """
+    Only http(s) URLs on a host listed in SOURCE_URL_ALLOWED_HOSTS (comma-separated) may be
+    fetched, so registered sources cannot be used to reach arbitrary internal services.
+    """
+    allowed = {h.strip().lower() for h in os.getenv("SOURCE_URL_ALLOWED_HOSTS", "").split(",") if h.strip()}
+    parsed = urlparse(file_url)
+    if parsed.scheme not in ("http", "https"):
+        raise ValueError("file_url must use http or https")
+    if not parsed.hostname or parsed.hostname.lower() not in allowed:
+        raise ValueError(f"file_url host '{parsed.hostname}' is not in SOURCE_URL_ALLOWED_HOSTS")
+    return file_url
+
+
+async def fetch_file_url(file_url: str) -> str:
+    validate_file_url(file_url)
+    # Redirects are not followed: they could point outside the allowlist.
+    async with httpx.AsyncClient(timeout=120.0, follow_redirects=False) as client:
+        resp = await client.get(file_url)
+        resp.raise_for_status()
+        return resp.text
+
+
+def source_hash(csv_content: str) -> str:
+    """Identifies a dataset by content, so uploads and scheduled fetches of the same file match."""
+    normalized = csv_content.replace("\r\n", "\n").strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+async def load_source(schedule: ScheduledDashboard) -> str:
+    if schedule.file_url:
+        return await fetch_file_url(schedule.file_url)
+    if schedule.source_path:
+        return resolve_source_path(schedule.source_path).read_text()
+    raise ValueError("Schedule has neither file_url nor source_path")
+
+
+def freshness(schedule: ScheduledDashboard, dashboard: Dashboard, now: Optional[datetime] = None) -> Dict[str, Any]:
+    now = now or datetime.utcnow()
+    age = (now - dashboard.created_at).total_seconds()
+    return {
+        "schedule_id": schedule.id,
+        "generated_at": dashboard.created_at,
+        "age_seconds": age,
+        # Older than one cadence means at least one scheduled refresh was missed.
+        "stale": age > schedule.cadence_minutes * 60,
+    }
+
+
+async def find_precomputed(
+    session: AsyncSession, content_hash: str, context: str
+) -> Optional[Tuple[ScheduledDashboard, Dashboard]]:
+    """
+    Returns the freshest precomputed dashboard for an enabled schedule whose last run used
+    the same source content (see `source_hash`) and context as the request.
+    """
+    statement = (
+        select(ScheduledDashboard)
+        .where(ScheduledDashboard.last_source_hash == content_hash)
+        .where(ScheduledDashboard.context == context)
+        .where(ScheduledDashboard.enabled == True)  # noqa: E712
+        .where(ScheduledDashboard.last_dashboard_id != None)  # noqa: E711
+        .order_by(ScheduledDashboard.last_run_at.desc())
+    )
+    schedule = (await session.execute(statement)).scalars().first()
+    if schedule is None:
+        return None
+    dashboard = await session.get(Dashboard, schedule.last_dashboard_id)
+    if dashboard is None:
+        return None
+    return schedule, dashboard
+
+
+class ScheduleAlreadyRunning(Exception):
+    pass
+
+
+class PrecomputeScheduler:
+    """
+    Background runner for recurring dashboards. During off-peak hours (UTC) it regenerates
+    due schedules through the KPI graph, at most `concurrency` at a time. It acts as a
+    low-priority lane: a run is not started while `is_busy()` reports interactive work, and
+    is picked up again on a later poll. Failed runs are retried with exponential backoff
+    starting at `retry_minutes` (capped at the cadence).
+    """
+
+    def __init__(
+        self,
+        offpeak_hours: str = None,
+        concurrency: int = None,
+        poll_seconds: float = None,
+        retry_minutes: float = None,
+    ):
+        self.offpeak = parse_hour_ranges(offpeak_hours or os.getenv("PRECOMPUTE_OFFPEAK_HOURS", "0-6"))
+        self.concurrency = concurrency or int(os.getenv("PRECOMPUTE_CONCURRENCY", "1"))
+        self.poll_seconds = poll_seconds or float(os.getenv("PRECOMPUTE_POLL_SECONDS", "60"))
+        self.retry_minutes = retry_minutes or float(os.getenv("PRECOMPUTE_RETRY_MINUTES", "5"))
+        self.is_busy: Callable[[], bool] = lambda: False
+        self.runs_completed = 0
+        self.runs_failed = 0
+        self._task: Optional[asyncio.Task] = None
+        # Schedules being regenerated right now (background loop or /run), one run each
+        self._running: set = set()
+
+    def in_offpeak(self, now: datetime) -> bool:
+        for start, end in self.offpeak:
+            if start <= end and start <= now.hour < end:
+                return True
+            if start > end and (now.hour >= start or now.hour < end):
+                return True
+        return False
+
+    @staticmethod
+    def current_slot(schedule: ScheduledDashboard, now: datetime) -> datetime:
+        """The latest slot (last_run_at + k * cadence) not after `now`; `now` if never run."""
+        if schedule.last_run_at is None:
+            return now
+        cadence = timedelta(minutes=schedule.cadence_minutes)
+        periods = max((now - schedule.last_run_at) // cadence, 0)
+        return schedule.last_run_at + periods * cadence
+
+    def retry_delay(self, schedule: ScheduledDashboard) -> timedelta:
+        minutes = self.retry_minutes * 2 ** max(schedule.failure_count - 1, 0)
+        return timedelta(minutes=min(minutes, schedule.cadence_minutes))
+
+    def is_due(self, schedule: ScheduledDashboard, now: datetime) -> bool:
+        if not schedule.enabled:
+            return False
+        if schedule.failure_count and schedule.last_attempt_at is not None:
+            if now - schedule.last_attempt_at < self.retry_delay(schedule):
+                return False
+        if schedule.last_run_at is None:
+            return True
+        return now - schedule.last_run_at >= timedelta(minutes=schedule.cadence_minutes)
+
+    async def run_due(self, now: Optional[datetime] = None) -> int:
+        """Runs every due schedule (respecting the concurrency cap); returns how many ran."""
+        now = now or datetime.utcnow()
+        async with AsyncSession(engine) as session:
+            schedules = (await session.execute(select(ScheduledDashboard))).scalars().all()
+        due_ids = [s.id for s in schedules if self.is_due(s, now)]
+        if not due_ids:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(schedule_id: int) -> bool:
+            async with semaphore:
+                if self.is_busy():
+                    # Interactive requests in flight; leave it for the next poll.
+                    return False
+                try:
+                    await self.run_schedule(schedule_id)
+                except ScheduleAlreadyRunning:
+                    return False
+                return True
+
+        results = await asyncio.gather(*[run_one(i) for i in due_ids])
+        return sum(results)
+
+    async def run_schedule(self, schedule_id: int) -> Optional[int]:
+        """
+        Regenerates one schedule and records the outcome; returns the new dashboard id, or
+        None if the run failed (see `last_error`). Raises ScheduleAlreadyRunning if another
+        run of the same schedule is in progress.
+        """
+        if schedule_id in self._running:
+            raise ScheduleAlreadyRunning(f"Schedule {schedule_id} is already being regenerated")
+        self._running.add(schedule_id)
+        try:
+            return await self._run_schedule(schedule_id)
+        finally:
+            self._running.discard(schedule_id)
+
+    async def _run_schedule(self, schedule_id: int) -> Optional[int]:
+        # Keep the session closed while the graph runs so persistence can write freely.
+        async with AsyncSession(engine) as session:
+            schedule = await session.get(ScheduledDashboard, schedule_id)
+        if schedule is None:
+            return None
+
+        started_at = datetime.utcnow()
+        slot = self.current_slot(schedule, started_at)
+        dashboard_id = None
+        content_hash = None
+        error = None
+        try:
+            csv_content = await load_source(schedule)
+            content_hash = source_hash(csv_content)
+            final_state = await run_kpi_graph(csv_content, schedule.context)
+            dashboard_id = final_state.get("dashboard_id")
+            if dashboard_id is None:
+                raise RuntimeError("KPI graph did not persist a dashboard")
+            self.runs_completed += 1
+        except Exception as e:
+            logger.error("Precompute of schedule %s failed: %s", schedule_id, e)
+            error = str(e)
+            self.runs_failed += 1
+
+        async with AsyncSession(engine) as session:
+            schedule = await session.get(ScheduledDashboard, schedule_id)
+            if schedule is None:
+                return dashboard_id
+            schedule.last_attempt_at = started_at
+            schedule.last_error = error
+            if dashboard_id is not None:
+                schedule.last_run_at = slot
+                schedule.failure_count = 0
+                schedule.last_dashboard_id = dashboard_id
+                schedule.last_source_hash = content_hash
+            else:
+                # last_run_at stays put, so the schedule is retried (after a backoff) rather
+                # than waiting a whole cadence.
+                schedule.failure_count += 1
+            session.add(schedule)
+            await session.commit()
+        return dashboard_id
+
+    async def _loop(self):
+        while True:
+            try:
+                if self.in_offpeak(datetime.utcnow()):
+                    await self.run_due()
+            except Exception as e:
+                logger.error("Precompute loop error: %s", e)
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self, is_busy: Callable[[], bool] = None):
+        if is_busy is not None:
+            self.is_busy = is_busy
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+precompute_scheduler = PrecomputeScheduler()
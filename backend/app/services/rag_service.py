@@ -1,50 +1,42 @@
 import json
-from typing import List, Dict, Any
-from app.core.db import get_chroma_collection
+from typing import List, Dict, Any, Optional
+from app.services.vector_store import get_vector_store
 
 class RAGService:
     def __init__(self):
-        self.collection = get_chroma_collection()
+        self.store = get_vector_store()
 
     def add_dashboard(self, dashboard_id: str, context: str, kpis: List[Dict], visualizations: List[Dict]):
         """
-        Embeds the dashboard context and summary into ChromaDB.
+        Embeds the dashboard context and summary into the vector store.
         """
         # Create a rich text representation for embedding
         kpi_names = ", ".join([k.get("name", "") if isinstance(k, dict) else getattr(k, "name", "") for k in kpis])
         viz_titles = ", ".join([v.get("title", "") if isinstance(v, dict) else getattr(v, "title", "") for v in visualizations])
-        
+
         document_text = f"Context: {context}\nKPIs: {kpi_names}\nVisualizations: {viz_titles}"
-        
+
         # Store metadata for retrieval
         metadata = {
             "dashboard_id": str(dashboard_id),
             "context": context
         }
-        
-        self.collection.add(
+
+        self.store.add(
             documents=[document_text],
             metadatas=[metadata],
             ids=[str(dashboard_id)]
         )
 
-    def query_similar(self, context: str, n_results: int = 3) -> List[Dict]:
+    def query_similar(self, context: str, n_results: int = 3, where: Optional[Dict[str, Any]] = None) -> List[Dict]:
         """
         Retrieves similar past dashboards based on context.
+        `where` filters on exact metadata values, e.g. {"context": "ecommerce sales"}.
         """
-        results = self.collection.query(
-            query_texts=[context],
-            n_results=n_results
-        )
-        
-        # Format results
-        similar_dashboards = []
-        if results["ids"]:
-            for i, doc_id in enumerate(results["ids"][0]):
-                similar_dashboards.append({
-                    "id": doc_id,
-                    "document": results["documents"][0][i],
-                    "metadata": results["metadatas"][0][i]
-                })
-                
-        return similar_dashboards
+        return self.query_similar_batch([context], n_results, where)[0]
+
+    def query_similar_batch(self, contexts: List[str], n_results: int = 3, where: Optional[Dict[str, Any]] = None) -> List[List[Dict]]:
+        """
+        Retrieves similar past dashboards for several contexts in a single lookup.
+        """
+        return self.store.query(contexts, n_results=n_results, where=where)
@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class RequestCoalescer:
+    """Single-flight runner for identical concurrent requests.
+    Callers that arrive with the same key while a run is in flight share its result
+    instead of starting another one. With a positive `window` (seconds), a finished
+    result is also reused by duplicates that arrive shortly after it completes.
+    """
+
+    def __init__(self, window: float = None):
+        if window is None:
+            window = float(os.getenv("COALESCE_WINDOW_SECONDS", "0"))
+        self.window = window
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._recent: Dict[str, Tuple[float, Any]] = {}
+        self.runs_started = 0
+        self.runs_coalesced = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        raw = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        self._evict_expired()
+        if key in self._recent:
+            self.runs_coalesced += 1
+            return self._recent[key][1]
+
+        task = self._inflight.get(key)
+        # A task bound to another (closed) event loop cannot be awaited from here.
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.runs_coalesced += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self.runs_started += 1
+            task.add_done_callback(lambda t: self._on_done(key, t))
+
+        # Shield so a disconnecting caller does not cancel the run for everyone else.
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs_started": self.runs_started,
+            "runs_coalesced": self.runs_coalesced,
+            "in_flight": len(self._inflight),
+            "window_seconds": self.window,
+        }
+
+    def _on_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if self.window > 0 and not task.cancelled() and task.exception() is None:
+            self._recent[key] = (time.monotonic(), task.result())
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.window
+        for key in [k for k, (finished_at, _) in self._recent.items() if finished_at < cutoff]:
+            del self._recent[key]
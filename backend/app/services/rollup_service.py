@@ -0,0 +1,194 @@
+import json
+import warnings
+from itertools import combinations
+from typing import List, Dict, Any, Optional, Tuple
+
+import pandas as pd
+
+DATE_KEYWORDS = ("date", "time", "month")
+
+
+def find_date_column(df: pd.DataFrame) -> Optional[str]:
+    """
+    Returns the first non-numeric column whose name suggests a date and whose values
+    mostly parse as dates. Numeric columns such as `months_active` are never dates,
+    even though `pd.to_datetime` would happily turn them into 1970 timestamps.
+    """
+    for col in df.columns:
+        if not any(keyword in str(col).lower() for keyword in DATE_KEYWORDS):
+            continue
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col
+        if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col]):
+            continue
+        values = df[col].dropna().astype(str)
+        if values.empty:
+            continue
+        with warnings.catch_warnings():
+            # Mixed/unknown formats only warn; unparseable values become NaT
+            warnings.simplefilter("ignore")
+            parsed = pd.to_datetime(values, errors="coerce")
+        if parsed.notna().mean() >= 0.8:
+            return col
+    return None
+
+
+class RollupEngine:
+    """
+    Precomputes group-by aggregates (date grain x categorical dimensions) for a dataset
+    so drill-down slices can be served from the stored dashboard without the raw data.
+
+    Each cube is keyed by "<grain>|<dim1>,<dim2>" ("all" when there is no date grain) and
+    holds one row per group with `<measure>__sum`, `<measure>__mean`, `__count` and
+    `<column>__distinct` fields, computed by a single vectorized groupby per cube. The time
+    bucket of a grained cube is stored as `__period`; both names are reserved so they never
+    collide with CSV columns such as `period` or `count`.
+
+    To keep the stored result small, dimension pairs are only crossed with the month grain
+    (and with no grain). Cubes with more than `max_rows_per_cube` groups, or that would push
+    the total past `max_total_rows`, are skipped and listed under "skipped" instead.
+    """
+
+    GRAINS = {"day": "D", "week": "W", "month": "M"}
+    PAIR_GRAINS = (None, "month")
+    AGGREGATIONS = ("sum", "mean", "count", "distinct")
+    PERIOD = "__period"
+    COUNT = "__count"
+
+    def __init__(
+        self,
+        max_dimensions: int = 4,
+        max_cardinality: int = 50,
+        max_rows_per_cube: int = 2000,
+        max_total_rows: int = 20000,
+    ):
+        self.max_dimensions = max_dimensions
+        self.max_cardinality = max_cardinality
+        self.max_rows_per_cube = max_rows_per_cube
+        self.max_total_rows = max_total_rows
+
+    @staticmethod
+    def cube_key(grain: Optional[str], dimensions: List[str]) -> str:
+        return f"{grain or 'all'}|{','.join(sorted(dimensions))}"
+
+    def build(self, df: pd.DataFrame) -> Dict[str, Any]:
+        if df.empty:
+            return {}
+
+        df = df.copy()
+        date_col = find_date_column(df)
+        grains: List[str] = []
+        if date_col:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+            grains = list(self.GRAINS)
+
+        measures = [c for c in df.select_dtypes(include=["number"]).columns if c != date_col]
+        categorical = [
+            c for c in df.columns
+            if c != date_col and c not in measures
+        ]
+        dimensions = [c for c in categorical if df[c].nunique(dropna=True) <= self.max_cardinality][: self.max_dimensions]
+        # High-cardinality categoricals (ids, emails, ...) are only useful as distinct counts.
+        distinct_cols = [c for c in categorical if c not in dimensions]
+
+        for dim in dimensions:
+            df[dim] = df[dim].astype(str).where(df[dim].notna(), "(missing)")
+        for grain in grains:
+            df[f"__{grain}"] = df[date_col].dt.to_period(self.GRAINS[grain]).astype(str)
+
+        named_aggs: Dict[str, Any] = {self.COUNT: (df.columns[0], "size")}
+        for m in measures:
+            named_aggs[f"{m}__sum"] = (m, "sum")
+            named_aggs[f"{m}__mean"] = (m, "mean")
+        for c in distinct_cols + dimensions:
+            named_aggs[f"{c}__distinct"] = (c, "nunique")
+
+        single_dims = [()] + [(d,) for d in dimensions]
+        pairs = list(combinations(dimensions, 2))
+        cubes: Dict[str, List[Dict[str, Any]]] = {}
+        skipped: List[str] = []
+        total_rows = 0
+        for grain in [None] + grains:
+            for dims in single_dims + (pairs if grain in self.PAIR_GRAINS else []):
+                key = self.cube_key(grain, list(dims))
+                keys = ([f"__{grain}"] if grain else []) + list(dims)
+                if not keys:
+                    frame = df.groupby(lambda _: 0).agg(**named_aggs).reset_index(drop=True)
+                else:
+                    grouped = df.groupby(keys, sort=True)
+                    # Checking the group count first avoids aggregating cubes we would not store.
+                    if grouped.ngroups > self.max_rows_per_cube or total_rows + grouped.ngroups > self.max_total_rows:
+                        skipped.append(key)
+                        continue
+                    frame = grouped.agg(**named_aggs).reset_index()
+                    if grain:
+                        frame = frame.rename(columns={f"__{grain}": self.PERIOD})
+                total_rows += len(frame)
+                # to_json turns numpy scalars/NaN into plain JSON values for storage.
+                cubes[key] = json.loads(frame.to_json(orient="records"))
+
+        return {
+            "date_column": date_col,
+            "grains": grains,
+            "dimensions": dimensions,
+            "measures": measures,
+            "cubes": cubes,
+            "skipped": skipped,
+        }
+
+    def split_filters(
+        self, rollups: Dict[str, Any], grain: Optional[str], filters: Dict[str, str]
+    ) -> Tuple[Optional[str], Dict[str, str]]:
+        """
+        Separates a time-bucket filter from dimension filters. `__period` always refers to
+        the bucket; plain `period` does too, unless the dataset has a `period` dimension.
+        """
+        filters = dict(filters)
+        period = filters.pop(self.PERIOD, None)
+        if period is None and "period" in filters and "period" not in rollups.get("dimensions", []):
+            period = filters.pop("period")
+        if period is not None and grain is None:
+            raise KeyError("Filtering on the period requires a grain")
+        return period, filters
+
+    def slice(
+        self,
+        rollups: Dict[str, Any],
+        grain: Optional[str] = None,
+        dimensions: Optional[List[str]] = None,
+        filters: Optional[Dict[str, str]] = None,
+        measure: Optional[str] = None,
+        aggregation: str = "sum",
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns rows of a precomputed cube, optionally filtered on dimension values
+        (e.g. {"region": "EU"}) and, when a grain is given, on the time bucket
+        (e.g. {"period": "2024-01"}), then projected down to a single measure/aggregation.
+        Raises KeyError when the requested cube or measure was not precomputed.
+        """
+        dimensions = list(dimensions or [])
+        period, filters = self.split_filters(rollups, grain, filters or {})
+        # Filtering on a dimension requires it to be part of the cube being sliced.
+        dimensions += [d for d in filters if d not in dimensions]
+
+        key = self.cube_key(grain, dimensions)
+        cube = rollups.get("cubes", {}).get(key)
+        if cube is None:
+            reason = "too many groups to precompute" if key in rollups.get("skipped", []) else "not precomputed"
+            raise KeyError(f"No rollup for grain={grain or 'all'} dimensions={sorted(dimensions)} ({reason})")
+
+        rows = [r for r in cube if all(str(r.get(k)) == str(v) for k, v in filters.items())]
+        if period is not None:
+            rows = [r for r in rows if str(r.get(self.PERIOD)) == str(period)]
+        if measure is None:
+            return rows
+
+        if aggregation not in self.AGGREGATIONS:
+            raise KeyError(f"Unsupported aggregation '{aggregation}'")
+        field = self.COUNT if aggregation == "count" else f"{measure}__{aggregation}"
+        if rows and field not in rows[0]:
+            raise KeyError(f"No rollup field '{field}'")
+        keep = ([self.PERIOD] if grain else []) + dimensions + [field]
+        return [{k: r.get(k) for k in keep} for r in rows]
@@ -0,0 +1,352 @@
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, IO, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class HashingEmbedder:
+    """
+    Dependency-free embedder: hashes word unigrams/bigrams into a fixed-size signed vector.
+    Used when sentence-transformers is not installed or when explicitly selected.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = re.findall(r"\w+", text.lower())
+            for token in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[i, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str = None):
+        from sentence_transformers import SentenceTransformer
+
+        model_name = model_name or os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.model = SentenceTransformer(model_name)
+        self.name = f"st-{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+class CachedEmbedder:
+    """
+    Wraps an embedder with an LRU cache keyed by a hash of (embedder name, text), so
+    repeated context strings are only embedded once. Vectors are L2-normalized. `embed`
+    never touches disk; `flush` persists the cache and is only called on the write path.
+    """
+
+    def __init__(self, embedder, path: Optional[str] = None, max_entries: int = None):
+        self.embedder = embedder
+        self.name = embedder.name
+        self.path = path
+        self.max_entries = max_entries or int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._dirty = False
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as stored:
+                    self._cache = OrderedDict((key, stored[key]) for key in stored.files[-self.max_entries:])
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable embedding cache %s: %s", path, e)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.name}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        keys = [self._key(t) for t in texts]
+        missing = list(dict.fromkeys(k for k in keys if k not in self._cache))
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        result: Dict[str, np.ndarray] = {k: self._cache[k] for k in keys if k in self._cache}
+        for k in result:
+            self._cache.move_to_end(k)
+        if missing:
+            by_key = dict(zip(keys, texts))
+            vectors = _normalize(self.embedder.embed([by_key[k] for k in missing]))
+            result.update(zip(missing, vectors))
+            self._cache.update(zip(missing, vectors))
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._dirty = True
+        return np.stack([result[k] for k in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+    def flush(self):
+        if self.path and self._dirty:
+            _atomic_write(self.path, lambda f: np.savez(f, **self._cache))
+            self._dirty = False
+
+
+def _atomic_write(path: str, write: Callable[[IO[bytes]], None]):
+    """Writes via a temp file and os.replace so readers never see a half-written file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _chroma_where(where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Chroma only accepts one field per filter; several equality fields must be combined with $and."""
+    if not where:
+        return None
+    if len(where) == 1 or any(k.startswith("$") for k in where):
+        return where
+    return {"$and": [{k: v} for k, v in where.items()]}
+
+
+class VectorStore(ABC):
+    """
+    Interface for dashboard similarity search. Results are one list per query text, each
+    entry a dict with id, document, metadata and score (higher is more similar).
+    """
+
+    @abstractmethod
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def query(self, texts: List[str], n_results: int = 3, where: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        ...
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process store: a matrix of normalized vectors queried with one matrix product
+    (cosine similarity). Persisted as `vectors.npy` (memory-mapped on load) plus
+    `index.json` for ids, documents and metadata, each written atomically. If the two
+    disagree after a crash, vectors are rebuilt from the documents in `index.json`.
+    Adding an existing id replaces it. Metadata filters are served from an in-memory
+    inverted index of (key, value) -> row positions, so they don't scan every document.
+    """
+
+    def __init__(self, embedder, path: Optional[str] = None):
+        self.embedder = embedder
+        self.path = path
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._postings: Dict[Tuple[str, Any], Set[int]] = {}
+        # Writable storage with spare rows so adds do not copy the whole matrix each time
+        self._buffer: Optional[np.ndarray] = None
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+
+    def _load(self):
+        index_path = os.path.join(self.path, "index.json")
+        vectors_path = os.path.join(self.path, "vectors.npy")
+        if not (os.path.exists(index_path) and os.path.exists(vectors_path)):
+            return
+        with open(index_path) as f:
+            index = json.load(f)
+        self.ids = index["ids"]
+        self.documents = index["documents"]
+        self.metadatas = index["metadatas"]
+        for i, metadata in enumerate(self.metadatas):
+            self._index_metadata(i, metadata)
+        if index.get("embedder") != self.embedder.name:
+            # index.json keeps the documents, so vectors can be rebuilt for the new embedder.
+            logger.warning(
+                "Vector store at %s was built with %s; re-embedding %d documents with %s",
+                self.path, index.get("embedder"), len(self.ids), self.embedder.name,
+            )
+            self._reembed()
+            return
+        vectors = np.load(vectors_path, mmap_mode="r")
+        if vectors.shape[0] != len(self.ids):
+            logger.warning("Vector store at %s has mismatched ids and vectors; re-embedding", self.path)
+            self._reembed()
+            return
+        self.vectors = vectors
+
+    def _reembed(self):
+        self._buffer = None
+        if self.documents:
+            self.vectors = _normalize(self.embedder.embed(self.documents))
+        else:
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._save()
+
+    def _save(self):
+        index = {"embedder": self.embedder.name, "ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}
+        _atomic_write(os.path.join(self.path, "vectors.npy"), lambda f: np.save(f, self.vectors))
+        _atomic_write(os.path.join(self.path, "index.json"), lambda f: f.write(json.dumps(index).encode("utf-8")))
+        if isinstance(self.embedder, CachedEmbedder):
+            self.embedder.flush()
+
+    def _index_metadata(self, position: int, metadata: Dict[str, Any], remove: bool = False):
+        for key, value in (metadata or {}).items():
+            try:
+                postings = self._postings.setdefault((key, value), set())
+            except TypeError:
+                # Unhashable values (lists, dicts) cannot be filtered on equality anyway.
+                continue
+            if remove:
+                postings.discard(position)
+            else:
+                postings.add(position)
+
+    def _filter(self, where: Dict[str, Any]) -> np.ndarray:
+        """Row positions whose metadata equals every (key, value) in `where`."""
+        try:
+            lists = sorted((self._postings.get(item, set()) for item in where.items()), key=len)
+        except TypeError:
+            return np.zeros(0, dtype=np.int64)
+        # Intersect starting from the rarest value.
+        matched = set(lists[0])
+        for postings in lists[1:]:
+            matched &= postings
+        return np.fromiter(sorted(matched), dtype=np.int64, count=len(matched))
+
+    def _reserve(self, rows: int, dim: int):
+        n = len(self.ids)
+        if self._buffer is not None and self._buffer.shape[1] == dim and self._buffer.shape[0] >= rows:
+            return
+        capacity = max(rows, 2 * (self._buffer.shape[0] if self._buffer is not None else n), 64)
+        buffer = np.zeros((capacity, dim), dtype=np.float32)
+        if n:
+            buffer[:n] = self.vectors[:n]
+        self._buffer = buffer
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        if not ids:
+            return
+        new_vectors = _normalize(self.embedder.embed(documents))
+        positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        new_ids = set(ids) - set(positions)
+        self._reserve(len(self.ids) + len(new_ids), new_vectors.shape[1])
+
+        for doc_id, document, metadata, vector in zip(ids, documents, metadatas, new_vectors):
+            if doc_id in positions:
+                i = positions[doc_id]
+                self._index_metadata(i, self.metadatas[i], remove=True)
+                self.documents[i] = document
+                self.metadatas[i] = metadata
+            else:
+                i = positions[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                self.documents.append(document)
+                self.metadatas.append(metadata)
+            self._index_metadata(i, metadata)
+            self._buffer[i] = vector
+
+        self.vectors = self._buffer[: len(self.ids)]
+        if self.path:
+            self._save()
+
+    def query(self, texts: List[str], n_results: int = 3, where: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        if not texts:
+            return []
+        if not self.ids:
+            return [[] for _ in texts]
+
+        candidates = self._filter(where) if where else np.arange(len(self.ids))
+        if candidates.size == 0:
+            return [[] for _ in texts]
+
+        # Scoring every row and picking the candidate columns avoids copying candidate rows.
+        scores = _normalize(self.embedder.embed(texts)) @ self.vectors.T
+        if where:
+            scores = scores[:, candidates]
+        k = min(n_results, candidates.size)
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([
+                {
+                    "id": self.ids[candidates[j]],
+                    "document": self.documents[candidates[j]],
+                    "metadata": self.metadatas[candidates[j]],
+                    "score": float(row[j]),
+                }
+                for j in top
+            ])
+        return results
+
+
+class ChromaVectorStore(VectorStore):
+    """Adapter over the Chroma `dashboards` collection (requires chromadb)."""
+
+    def __init__(self):
+        from app.core.db import get_chroma_collection
+
+        self.collection = get_chroma_collection()
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+
+    def query(self, texts: List[str], n_results: int = 3, where: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        results = self.collection.query(query_texts=texts, n_results=n_results, where=_chroma_where(where))
+        formatted = []
+        for q, ids in enumerate(results["ids"] or []):
+            formatted.append([
+                {
+                    "id": doc_id,
+                    "document": results["documents"][q][i],
+                    "metadata": results["metadatas"][q][i],
+                    # Chroma returns distances; negate so higher is more similar, like the numpy store.
+                    "score": -float(results["distances"][q][i]) if results.get("distances") else None,
+                }
+                for i, doc_id in enumerate(ids)
+            ])
+        return formatted
+
+
+def get_embedder():
+    """
+    RAG_EMBEDDER is "sentence-transformers", "hashing" or "auto" (default: sentence-transformers
+    when the package is installed, hashing otherwise). A selected embedder that fails to load
+    raises rather than silently switching to a different embedding space.
+    """
+    choice = os.getenv("RAG_EMBEDDER", "auto")
+    if choice == "auto":
+        choice = "sentence-transformers" if importlib.util.find_spec("sentence_transformers") else "hashing"
+    if choice == "sentence-transformers":
+        return SentenceTransformerEmbedder()
+    if choice == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown RAG_EMBEDDER '{choice}'")
+
+
+_store: Optional[VectorStore] = None
+
+
+def get_vector_store() -> VectorStore:
+    """Process-wide store selected by VECTOR_STORE ("numpy", the default, or "chroma")."""
+    global _store
+    if _store is None:
+        if os.getenv("VECTOR_STORE", "numpy") == "chroma":
+            _store = ChromaVectorStore()
+        else:
+            path = os.getenv("VECTOR_STORE_PATH", "./vector_store")
+            os.makedirs(path, exist_ok=True)
+            embedder = CachedEmbedder(get_embedder(), os.path.join(path, "embedding_cache.npz"))
+            _store = NumpyVectorStore(embedder, path)
+    return _store
@@ -1,5 +1,7 @@
-from typing import List, Dict, Any
+import re
+from typing import List, Dict, Any, Optional
 from ..models.viz import VisualizationSpec
+from .rollup_service import RollupEngine, find_date_column
 import pandas as pd
 
 
@@ -9,17 +11,29 @@ class VisualizationAgent:
     Uses sample data to build Plotly configs so charts render without manual tweaks.
     """
 
-    def run(self, kpi_definitions: List[Dict[str, Any]], schema: str, sample_data: List[Dict[str, Any]] | None = None) -> List[VisualizationSpec]:
+    MAX_BREAKDOWNS = 2
+    RATE_KEYWORDS = ["rate", "ratio", "percent", "%"]
+
+    def _is_id_column(self, column: str) -> bool:
+        # customer_id, id, customerId: summing or averaging identifiers is meaningless.
+        return re.search(r"(^|_)id$", column.lower()) is not None or re.search(r"[a-z]Id$", column) is not None
+
+    def _aggregation_for(self, column: str) -> str:
+        # Summing rates across rows (e.g. conversion_rate per region) is meaningless.
+        return "mean" if any(keyword in column.lower() for keyword in self.RATE_KEYWORDS) else "sum"
+
+    def run(
+        self,
+        kpi_definitions: List[Dict[str, Any]],
+        schema: str,
+        sample_data: List[Dict[str, Any]] | None = None,
+        rollups: Dict[str, Any] | None = None,
+    ) -> List[VisualizationSpec]:
         df = pd.DataFrame(sample_data or [])
         specs: List[VisualizationSpec] = []
 
-        date_col = None
-        if not df.empty:
-            # Prefer explicit date/time column
-            for col in df.columns:
-                if "date" in col.lower() or "time" in col.lower():
-                    date_col = col
-                    break
+        # Prefer an explicit date/time column (same detection as the rollups)
+        date_col = find_date_column(df) if not df.empty else None
 
         # If we have data, build plots from actual columns
         if not df.empty:
@@ -30,13 +44,20 @@ class VisualizationAgent:
             # Build one spec per numeric column (up to 6 to avoid overload)
             for col in numeric_cols[:6]:
                 chart_type = "line"
-                if any(keyword in col.lower() for keyword in ["rate", "ratio", "percent", "%"]):
+                aggregation = self._aggregation_for(col)
+                if any(keyword in col.lower() for keyword in self.RATE_KEYWORDS):
                     chart_type = "line"
                 elif any(keyword in col.lower() for keyword in ["share", "split"]):
                     chart_type = "bar"
 
-                x_values = df[date_col].tolist() if date_col else list(range(len(df)))
-                y_values = df[col].tolist()
+                if date_col and df[date_col].duplicated().any():
+                    # Several rows per date (e.g. one per region): sum totals, average rates.
+                    series = df.groupby(date_col, sort=False)[col].agg(aggregation)
+                    x_values = series.index.tolist()
+                    y_values = series.tolist()
+                else:
+                    x_values = df[date_col].tolist() if date_col else list(range(len(df)))
+                    y_values = df[col].tolist()
 
                 specs.append(
                     VisualizationSpec(
@@ -44,6 +65,7 @@ class VisualizationAgent:
                         title=f"{col.replace('_', ' ').title()} Overview",
                         x_axis=date_col or "index",
                         y_axis=col,
+                        aggregation=aggregation,
                         plotly_config={
                             "data": [
                                 {
@@ -63,6 +85,9 @@ class VisualizationAgent:
                     )
                 )
 
+        if specs and rollups:
+            specs.extend(self._breakdown_specs(rollups, kpi_definitions))
+
         # If no data or no numeric columns, fall back to KPI-only stubs
         if not specs:
             for kpi in kpi_definitions:
@@ -83,3 +108,53 @@ class VisualizationAgent:
                 )
 
         return specs
+
+    def _breakdown_measure(self, measures: List[str], kpi_definitions: List[Dict[str, Any]]) -> Optional[str]:
+        """The first measure referenced by an extracted KPI, else the first non-id measure."""
+        candidates = [m for m in measures if not self._is_id_column(m)]
+        for kpi in kpi_definitions:
+            text = f"{kpi.get('formula', '')} {kpi.get('name', '')}".lower()
+            for measure in candidates:
+                if re.search(rf"(?<![a-z0-9_]){re.escape(measure.lower())}(?![a-z0-9_])", text):
+                    return measure
+        return candidates[0] if candidates else None
+
+    def _breakdown_specs(
+        self, rollups: Dict[str, Any], kpi_definitions: List[Dict[str, Any]]
+    ) -> List[VisualizationSpec]:
+        """Bar charts of the primary measure per categorical dimension, read from precomputed rollups."""
+        specs: List[VisualizationSpec] = []
+        measure = self._breakdown_measure(rollups.get("measures", []), kpi_definitions)
+        if measure is None:
+            return specs
+
+        aggregation = self._aggregation_for(measure)
+        for dim in rollups.get("dimensions", [])[: self.MAX_BREAKDOWNS]:
+            rows = RollupEngine().slice(rollups, dimensions=[dim], measure=measure, aggregation=aggregation)
+            title = f"{measure.replace('_', ' ').title()} by {dim.replace('_', ' ').title()}"
+            specs.append(
+                VisualizationSpec(
+                    chart_type="bar",
+                    title=title,
+                    x_axis=dim,
+                    y_axis=measure,
+                    aggregation=aggregation,
+                    plotly_config={
+                        "data": [
+                            {
+                                "type": "bar",
+                                "x": [r[dim] for r in rows],
+                                "y": [r[f"{measure}__{aggregation}"] for r in rows],
+                                "name": measure,
+                                "marker": {"color": "#22d3ee"},
+                            }
+                        ],
+                        "layout": {
+                            "title": title,
+                            "xaxis": {"title": dim},
+                            "yaxis": {"title": f"{measure} ({aggregation})"},
+                        },
+                    },
+                )
+            )
+        return specs
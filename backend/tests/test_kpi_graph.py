@@ -27,3 +27,16 @@ async def test_kpi_graph_execution():
         assert final_state["kpis"][0]["name"] == "Revenue"
         assert len(final_state["visualizations"]) == 1
         assert final_state["narrative"] == "Executive Summary: Revenue is good."
+
+@pytest.mark.asyncio
+async def test_rollup_failure_is_reported():
+    from app.graphs.kpi_graph import run_kpi_graph
+
+    with patch('app.services.llm_client.LLMClient.chat', new=AsyncMock()) as mock_chat, \
+         patch('app.graphs.kpi_graph.RollupEngine.build', side_effect=ValueError("boom")):
+        mock_chat.side_effect = ['[]', "Summary."]
+        final_state = await run_kpi_graph("date,region,revenue\n2024-01-01,EU,10\n", "test context")
+
+    assert final_state["rollups"] == {}
+    assert final_state["rollups_error"] == "Error building rollups: boom"
+    assert final_state["dashboard_id"] is not None
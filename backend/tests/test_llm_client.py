@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from app.services import llm_client
+from app.services.llm_client import (
+    LLMClient,
+    ModelScheduler,
+    SHARED_SYSTEM_PROMPT,
+    get_model_options,
+    parse_model_option_overrides,
+    scheduler_enabled,
+)
+
+def test_payload_includes_model_options_and_shared_prefix(monkeypatch):
+    overrides = parse_model_option_overrides('{"*": {"num_thread": 4}, "llama3.2:3b": {"num_ctx": 2048}}')
+    monkeypatch.setattr(llm_client, "MODEL_OPTION_OVERRIDES", overrides)
+    client = LLMClient(model="llama3.2:3b", base_url="http://ollama.test")
+
+    payload = client.build_payload([
+        {"role": "system", "content": "Summarize."},
+        {"role": "user", "content": "KPI Data: []"},
+    ])
+
+    assert payload["keep_alive"] == "30m"
+    assert payload["options"]["num_ctx"] == 2048
+    assert payload["options"]["num_thread"] == 4
+    assert "keep_alive" not in payload["options"]
+    assert payload["messages"][0]["content"].startswith(SHARED_SYSTEM_PROMPT)
+    assert payload["messages"][0]["content"].endswith("Summarize.")
+    assert len(payload["messages"]) == 2
+
+def test_malformed_model_options_are_ignored(monkeypatch):
+    assert parse_model_option_overrides("not json") == {}
+    assert parse_model_option_overrides("[1, 2]") == {}
+    overrides = parse_model_option_overrides('{"*": 5, "llama3.2:3b": {"num_ctx": 1024}}')
+    assert overrides == {"llama3.2:3b": {"num_ctx": 1024}}
+
+    monkeypatch.setattr(llm_client, "MODEL_OPTION_OVERRIDES", overrides)
+    assert get_model_options("llama3.2:3b")["num_ctx"] == 1024
+    assert get_model_options("qwen2.5-coder:3b")["num_ctx"] == 8192
+
+@pytest.mark.asyncio
+async def test_scheduler_groups_calls_by_model():
+    scheduler = ModelScheduler(enabled=True)
+    order = []
+
+    async def call(model):
+        await scheduler.acquire(model)
+        try:
+            order.append(model)
+            await asyncio.sleep(0.01)
+        finally:
+            scheduler.release(model)
+
+    await asyncio.gather(call("a"), call("b"), call("a"), call("b"), call("a"))
+
+    assert order == ["a", "b", "b", "a", "a"]
+    assert scheduler.model_switches == 2
+    assert scheduler.active_count == 0
+
+@pytest.mark.asyncio
+async def test_scheduler_does_not_starve_waiting_model():
+    scheduler = ModelScheduler(enabled=True)
+    order = []
+
+    async def call(model, delay=0.01):
+        await scheduler.acquire(model)
+        try:
+            order.append(model)
+            await asyncio.sleep(delay)
+        finally:
+            scheduler.release(model)
+
+    first = asyncio.ensure_future(call("extract", 0.05))
+    await asyncio.sleep(0)
+    narrate = asyncio.ensure_future(call("narrate"))
+    await asyncio.sleep(0)
+    # A steady stream of extraction calls arrives after the narrative call queued
+    later = [asyncio.ensure_future(call("extract")) for _ in range(5)]
+    await asyncio.gather(first, narrate, *later)
+
+    assert order == ["extract", "narrate"] + ["extract"] * 5
+
+def test_scheduler_toggle(monkeypatch):
+    monkeypatch.delenv("OLLAMA_SCHEDULER", raising=False)
+    monkeypatch.setenv("OLLAMA_MAX_LOADED_MODELS", "2")
+    assert not scheduler_enabled()
+    monkeypatch.setenv("OLLAMA_SCHEDULER", "on")
+    assert scheduler_enabled()
+    monkeypatch.setenv("OLLAMA_SCHEDULER", "auto")
+    monkeypatch.delenv("OLLAMA_MAX_LOADED_MODELS")
+    assert scheduler_enabled()
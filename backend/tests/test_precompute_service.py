@@ -0,0 +1,230 @@
+import pytest
+from datetime import datetime, timedelta
+from app.models.schedule import ScheduledDashboard
+from app.services.precompute_service import PrecomputeScheduler, ScheduleAlreadyRunning, resolve_source_path, source_hash, validate_file_url
+
+def test_offpeak_hours_and_due_schedules():
+    scheduler = PrecomputeScheduler(offpeak_hours="22-6,12", concurrency=2, poll_seconds=1)
+    assert scheduler.in_offpeak(datetime(2024, 1, 1, 23))
+    assert scheduler.in_offpeak(datetime(2024, 1, 1, 3))
+    assert scheduler.in_offpeak(datetime(2024, 1, 1, 12))
+    assert not scheduler.in_offpeak(datetime(2024, 1, 1, 9))
+
+    now = datetime(2024, 1, 2, 2)
+    never_run = ScheduledDashboard(name="a", source_path="a.csv")
+    fresh = ScheduledDashboard(name="b", source_path="b.csv", cadence_minutes=60, last_run_at=now - timedelta(minutes=30))
+    due = ScheduledDashboard(name="c", source_path="c.csv", cadence_minutes=60, last_run_at=now - timedelta(minutes=61))
+    disabled = ScheduledDashboard(name="d", source_path="d.csv", enabled=False)
+
+    assert scheduler.is_due(never_run, now)
+    assert not scheduler.is_due(fresh, now)
+    assert scheduler.is_due(due, now)
+    assert not scheduler.is_due(disabled, now)
+
+def test_due_time_is_anchored_to_slot_and_failures_back_off():
+    scheduler = PrecomputeScheduler(offpeak_hours="0-6", poll_seconds=1, retry_minutes=5)
+    slot = datetime(2024, 1, 1, 0, 0)
+    daily = ScheduledDashboard(name="a", source_path="a.csv", last_run_at=slot)
+
+    # A run starting a few minutes late (or a day late) still lands on the midnight slot
+    assert scheduler.current_slot(daily, datetime(2024, 1, 2, 0, 7)) == datetime(2024, 1, 2)
+    assert scheduler.current_slot(daily, datetime(2024, 1, 3, 1, 0)) == datetime(2024, 1, 3)
+    assert scheduler.current_slot(ScheduledDashboard(name="b", source_path="b.csv"), slot) == slot
+
+    # After failed attempts the schedule is retried after 5, 10, 20... minutes
+    daily.failure_count = 2
+    daily.last_attempt_at = datetime(2024, 1, 2, 0, 1)
+    assert not scheduler.is_due(daily, datetime(2024, 1, 2, 0, 10))
+    assert scheduler.is_due(daily, datetime(2024, 1, 2, 0, 11))
+    daily.failure_count = 30
+    assert scheduler.retry_delay(daily) == timedelta(days=1)
+
+def test_source_path_must_stay_in_source_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PRECOMPUTE_SOURCE_DIR", str(tmp_path))
+    assert resolve_source_path("sales/daily.csv") == tmp_path / "sales" / "daily.csv"
+    with pytest.raises(ValueError):
+        resolve_source_path("../secrets.csv")
+
+def test_file_url_must_be_http_on_allowed_host(monkeypatch):
+    monkeypatch.setenv("SOURCE_URL_ALLOWED_HOSTS", "data.example.com")
+    assert validate_file_url("https://data.example.com/sales.csv")
+    for url in [
+        "http://169.254.169.254/latest/meta-data/",
+        "file:///etc/passwd",
+        "ftp://data.example.com/sales.csv",
+        "https://data.example.com.evil.test/sales.csv",
+    ]:
+        with pytest.raises(ValueError):
+            validate_file_url(url)
+
+    monkeypatch.delenv("SOURCE_URL_ALLOWED_HOSTS")
+    with pytest.raises(ValueError):
+        validate_file_url("https://data.example.com/sales.csv")
+
+def test_source_hash_ignores_line_endings():
+    csv = "month,revenue\n2024-01,10\n2024-02,12\n"
+    assert source_hash(csv) == source_hash(csv.replace("\n", "\r\n"))
+    assert source_hash(csv) != source_hash(csv.replace("12", "13"))
+
+@pytest.mark.asyncio
+async def test_same_schedule_cannot_run_twice_concurrently(monkeypatch):
+    import asyncio
+    scheduler = PrecomputeScheduler(offpeak_hours="0-24", concurrency=2, poll_seconds=1)
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_run(schedule_id):
+        started.set()
+        await release.wait()
+        return 7
+
+    monkeypatch.setattr(scheduler, "_run_schedule", slow_run)
+    first = asyncio.ensure_future(scheduler.run_schedule(1))
+    await started.wait()
+    with pytest.raises(ScheduleAlreadyRunning):
+        await scheduler.run_schedule(1)
+    release.set()
+    assert await first == 7
+    # The lock is released once the run finishes
+    assert await scheduler.run_schedule(1) == 7
+
+@pytest.mark.asyncio
+async def test_failed_run_is_retried_instead_of_waiting_a_cadence(db_engine, monkeypatch):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.services import precompute_service
+
+    monkeypatch.setattr(precompute_service, "engine", db_engine)
+    async with AsyncSession(db_engine) as session:
+        schedule = ScheduledDashboard(name="sales", source_path="sales.csv", last_run_at=datetime(2024, 1, 1))
+        session.add(schedule)
+        await session.commit()
+        await session.refresh(schedule)
+        schedule_id = schedule.id
+
+    async def fail(schedule):
+        raise OSError("source unavailable")
+
+    monkeypatch.setattr(precompute_service, "load_source", fail)
+    scheduler = PrecomputeScheduler(poll_seconds=1, retry_minutes=5)
+    assert await scheduler.run_schedule(schedule_id) is None
+
+    async with AsyncSession(db_engine) as session:
+        schedule = await session.get(ScheduledDashboard, schedule_id)
+    assert schedule.last_run_at == datetime(2024, 1, 1)
+    assert schedule.failure_count == 1
+    assert schedule.last_error == "source unavailable"
+    assert scheduler.is_due(schedule, schedule.last_attempt_at + timedelta(minutes=5))
+
+CSV = "month,revenue\n2024-01,10\n2024-02,12\n"
+
+async def add_precomputed(engine, context="sales", enabled=True):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.models.dashboard import Dashboard
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        dashboard = Dashboard(context=context, data={"kpis": [], "visualizations": [], "narrative": "precomputed"})
+        session.add(dashboard)
+        await session.commit()
+        await session.refresh(dashboard)
+        schedule = ScheduledDashboard(
+            name="sales", source_path="sales.csv", context=context, enabled=enabled,
+            last_run_at=datetime.utcnow(), last_dashboard_id=dashboard.id, last_source_hash=source_hash(CSV),
+        )
+        session.add(schedule)
+        await session.commit()
+        return dashboard.id
+
+@pytest.mark.asyncio
+async def test_find_precomputed_matches_content_context_and_enabled(db_engine):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.services.precompute_service import find_precomputed
+
+    dashboard_id = await add_precomputed(db_engine)
+    await add_precomputed(db_engine, context="disabled", enabled=False)
+    async with AsyncSession(db_engine) as session:
+        schedule, dashboard = await find_precomputed(session, source_hash(CSV.replace("\n", "\r\n")), "sales")
+        assert dashboard.id == dashboard_id
+        assert await find_precomputed(session, source_hash(CSV), "marketing") is None
+        assert await find_precomputed(session, source_hash(CSV + "2024-03,9\n"), "sales") is None
+        assert await find_precomputed(session, source_hash(CSV), "disabled") is None
+
+@pytest.mark.asyncio
+async def test_kpi_endpoint_serves_precomputed_dashboard(db_engine, monkeypatch):
+    import httpx
+    from unittest.mock import AsyncMock
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.api import routes_kpi
+    from app.core.db import get_session
+    from app.main import app
+
+    async def session_override():
+        async with AsyncSession(db_engine, expire_on_commit=False) as session:
+            yield session
+
+    dashboard_id = await add_precomputed(db_engine)
+    await add_precomputed(db_engine, context="disabled", enabled=False)
+    live = AsyncMock(return_value={"kpis": [], "visualizations": [], "narrative": "live", "dashboard_id": 999})
+    monkeypatch.setattr(routes_kpi, "run_kpi_graph", live)
+    app.dependency_overrides[get_session] = session_override
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            hit = (await client.post("/kpi/", json={"csv_content": CSV, "context": "sales"})).json()
+            other_context = (await client.post("/kpi/", json={"csv_content": CSV, "context": "marketing"})).json()
+            disabled = (await client.post("/kpi/", json={"csv_content": CSV, "context": "disabled"})).json()
+    finally:
+        app.dependency_overrides.pop(get_session)
+
+    assert hit["precomputed"] and hit["dashboard_id"] == dashboard_id
+    assert hit["freshness"]["stale"] is False
+    assert not other_context["precomputed"] and other_context["narrative"] == "live"
+    assert not disabled["precomputed"] and disabled["narrative"] == "live"
+    assert live.await_count == 2
+
+async def add_schedules(engine, count):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async with AsyncSession(engine) as session:
+        session.add_all([ScheduledDashboard(name=f"s{i}", source_path=f"s{i}.csv") for i in range(count)])
+        await session.commit()
+
+@pytest.mark.asyncio
+async def test_run_due_respects_concurrency_cap(db_engine, monkeypatch):
+    import asyncio
+    from app.services import precompute_service
+
+    monkeypatch.setattr(precompute_service, "engine", db_engine)
+    await add_schedules(db_engine, 5)
+    scheduler = PrecomputeScheduler(concurrency=2, poll_seconds=1)
+    running, peak = 0, 0
+
+    async def fake_run(schedule_id):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return schedule_id
+
+    monkeypatch.setattr(scheduler, "run_schedule", fake_run)
+    assert await scheduler.run_due() == 5
+    assert peak == 2
+
+@pytest.mark.asyncio
+async def test_run_due_skips_while_busy(db_engine, monkeypatch):
+    from unittest.mock import AsyncMock
+    from app.services import precompute_service
+
+    monkeypatch.setattr(precompute_service, "engine", db_engine)
+    await add_schedules(db_engine, 3)
+    scheduler = PrecomputeScheduler(concurrency=1, poll_seconds=1)
+    fake_run = AsyncMock(return_value=1)
+    monkeypatch.setattr(scheduler, "run_schedule", fake_run)
+
+    scheduler.is_busy = lambda: True
+    assert await scheduler.run_due() == 0
+    fake_run.assert_not_awaited()
+
+    # Skipped schedules are picked up by the next poll once interactive work is done
+    scheduler.is_busy = lambda: False
+    assert await scheduler.run_due() == 3
@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from app.services.request_coalescer import RequestCoalescer
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_share_one_run():
+    coalescer = RequestCoalescer(window=0)
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"narrative": "shared"}
+
+    key = RequestCoalescer.make_key("csv", "context", {"kpi_model": "m"})
+    results = await asyncio.gather(*[coalescer.run(key, factory) for _ in range(3)])
+
+    assert calls == 1
+    assert all(r == {"narrative": "shared"} for r in results)
+    assert coalescer.stats()["runs_started"] == 1
+    assert coalescer.stats()["runs_coalesced"] == 2
+    assert coalescer.stats()["in_flight"] == 0
+
+    # Without a window, a later identical request starts a fresh run.
+    await coalescer.run(key, factory)
+    assert calls == 2
+
+@pytest.mark.asyncio
+async def test_window_reuses_finished_result():
+    coalescer = RequestCoalescer(window=60)
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    key = RequestCoalescer.make_key("a")
+    assert await coalescer.run(key, factory) == 1
+    assert await coalescer.run(key, factory) == 1
+    assert await coalescer.run(RequestCoalescer.make_key("b"), factory) == 2
+
+@pytest.fixture
+def kpi_client(db_engine, monkeypatch):
+    import httpx
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.api import routes_kpi
+    from app.core.db import get_session
+    from app.main import app
+
+    async def session_override():
+        async with AsyncSession(db_engine, expire_on_commit=False) as session:
+            yield session
+
+    calls = []
+
+    async def fake_graph(csv_content, context):
+        calls.append((csv_content, context))
+        await asyncio.sleep(0.05)
+        return {"kpis": [], "visualizations": [], "narrative": context, "dashboard_id": len(calls)}
+
+    coalescer = RequestCoalescer(window=0)
+    monkeypatch.setattr(routes_kpi, "coalescer", coalescer)
+    monkeypatch.setattr(routes_kpi, "run_kpi_graph", fake_graph)
+    app.dependency_overrides[get_session] = session_override
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield client, calls, coalescer
+    app.dependency_overrides.pop(get_session)
+
+CSV = "month,revenue\n2024-01,10\n"
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_kpi_posts_share_one_graph_run(kpi_client):
+    client, calls, coalescer = kpi_client
+    async with client:
+        responses = await asyncio.gather(*[
+            client.post("/kpi/", json={"csv_content": CSV, "context": "sales"}) for _ in range(2)
+        ])
+
+    assert len(calls) == 1
+    assert [r.json()["dashboard_id"] for r in responses] == [1, 1]
+    assert coalescer.stats()["runs_coalesced"] == 1
+
+@pytest.mark.asyncio
+async def test_kpi_coalescing_key_covers_context_and_model_options(kpi_client, monkeypatch):
+    from app.services import llm_client
+    from app.graphs.kpi_graph import NARRATIVE_MODEL
+
+    client, calls, coalescer = kpi_client
+    keys = []
+    run = coalescer.run
+
+    async def record_key(key, factory):
+        keys.append(key)
+        return await run(key, factory)
+
+    monkeypatch.setattr(coalescer, "run", record_key)
+    async with client:
+        await client.post("/kpi/", json={"csv_content": CSV, "context": "sales"})
+        await client.post("/kpi/", json={"csv_content": CSV.replace("\n", "\r\n"), "context": "sales"})
+        await client.post("/kpi/", json={"csv_content": CSV, "context": "marketing"})
+        monkeypatch.setattr(llm_client, "MODEL_OPTION_OVERRIDES", {NARRATIVE_MODEL: {"temperature": 0.9}})
+        await client.post("/kpi/", json={"csv_content": CSV, "context": "sales"})
+
+    # Same content (modulo line endings) and context share a key; context and options change it
+    assert keys[0] == keys[1]
+    assert len({keys[0], keys[2], keys[3]}) == 3
@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+from app.services.rollup_service import RollupEngine, find_date_column
+
+def make_df():
+    return pd.DataFrame({
+        "date": ["2024-01-01", "2024-01-01", "2024-02-03", "2024-02-04"],
+        "region": ["EU", "US", "EU", None],
+        "plan": ["pro", "free", "pro", "pro"],
+        "revenue": [10, 20, 30, 40],
+    })
+
+def test_rollup_build_and_slice():
+    engine = RollupEngine()
+    rollups = engine.build(make_df())
+
+    assert rollups["date_column"] == "date"
+    assert rollups["dimensions"] == ["region", "plan"]
+    assert rollups["measures"] == ["revenue"]
+    assert rollups["cubes"]["all|"] == [{
+        "__count": 4, "revenue__sum": 100, "revenue__mean": 25.0,
+        "region__distinct": 3, "plan__distinct": 2,
+    }]
+
+    by_month = engine.slice(rollups, grain="month", dimensions=["region"], measure="revenue")
+    assert {"__period": "2024-02", "region": "EU", "revenue__sum": 30} in by_month
+    assert {"__period": "2024-02", "region": "(missing)", "revenue__sum": 40} in by_month
+
+    # Drill into EU and break down by plan
+    eu = engine.slice(rollups, dimensions=["plan"], filters={"region": "EU"}, measure="revenue", aggregation="mean")
+    assert eu == [{"plan": "pro", "region": "EU", "revenue__mean": 20.0}]
+
+def test_rollup_slice_unknown_cube():
+    engine = RollupEngine()
+    rollups = engine.build(make_df())
+    with pytest.raises(KeyError):
+        engine.slice(rollups, grain="quarter")
+
+def test_numeric_columns_are_never_date_columns():
+    df = pd.DataFrame({
+        "months_active": [1, 2, 3],
+        "signup_date": ["2024-01-01", "2024-02-01", "2024-02-03"],
+        "plan": ["pro", "free", "pro"],
+        "revenue": [10, 20, 30],
+    })
+    assert find_date_column(df) == "signup_date"
+
+    rollups = RollupEngine().build(df)
+    assert rollups["date_column"] == "signup_date"
+    assert rollups["measures"] == ["months_active", "revenue"]
+    assert rollups["dimensions"] == ["plan"]
+
+def test_large_cubes_are_skipped():
+    engine = RollupEngine(max_rows_per_cube=3)
+    rollups = engine.build(make_df())
+
+    # Dimension pairs are only crossed with the month grain (and no grain)
+    assert "day|plan,region" not in rollups["cubes"]
+    assert "day|region" in rollups["skipped"]
+    with pytest.raises(KeyError, match="too many groups"):
+        engine.slice(rollups, grain="day", dimensions=["region"])
+
+def test_drill_into_single_period():
+    engine = RollupEngine()
+    rollups = engine.build(make_df())
+
+    jan = engine.slice(rollups, grain="month", dimensions=["plan"], filters={"period": "2024-01"}, measure="revenue")
+    assert jan == [
+        {"__period": "2024-01", "plan": "free", "revenue__sum": 20},
+        {"__period": "2024-01", "plan": "pro", "revenue__sum": 10},
+    ]
+    with pytest.raises(KeyError, match="requires a grain"):
+        engine.slice(rollups, filters={"period": "2024-01"})
+
+def test_columns_named_like_output_fields_do_not_collide():
+    df = pd.DataFrame({
+        "date": ["2024-01-01", "2024-01-15", "2024-04-02"],
+        "period": ["Q1", "Q1", "Q2"],
+        "count": [1, 2, 3],
+        "revenue": [10, 20, 30],
+    })
+    engine = RollupEngine()
+    rollups = engine.build(df)
+
+    assert rollups["dimensions"] == ["period"]
+    assert rollups["measures"] == ["count", "revenue"]
+    rows = engine.slice(rollups, grain="month", dimensions=["period"], filters={"period": "Q1"}, measure="count")
+    assert rows == [{"__period": "2024-01", "period": "Q1", "count__sum": 3}]
+    assert engine.slice(rollups, grain="month", filters={"__period": "2024-04"}, aggregation="count", measure="revenue") == [
+        {"__period": "2024-04", "__count": 1}
+    ]
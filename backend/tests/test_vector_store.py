@@ -0,0 +1,108 @@
+import json
+from app.services.vector_store import CachedEmbedder, HashingEmbedder, NumpyVectorStore
+
+def make_store(path):
+    return NumpyVectorStore(CachedEmbedder(HashingEmbedder(), str(path / "embedding_cache.npz")), str(path))
+
+def test_numpy_store_query_filter_and_persistence(tmp_path):
+    store = make_store(tmp_path)
+    store.add(
+        ids=["1", "2", "3"],
+        documents=["ecommerce sales revenue orders", "saas mrr churn customers", "ecommerce marketing spend"],
+        metadatas=[{"team": "retail"}, {"team": "saas"}, {"team": "marketing"}],
+    )
+
+    results = store.query(["ecommerce sales revenue", "saas churn"], n_results=2)
+    assert [r["id"] for r in results[0]][0] == "1"
+    assert results[1][0]["id"] == "2"
+    assert results[0][0]["score"] >= results[0][1]["score"]
+
+    filtered = store.query(["ecommerce sales revenue"], n_results=3, where={"team": "marketing"})
+    assert [r["id"] for r in filtered[0]] == ["3"]
+
+    # Re-adding an id replaces it rather than duplicating
+    store.add(ids=["2"], documents=["saas mrr expansion"], metadatas=[{"team": "saas"}])
+    assert len(store.ids) == 3
+
+    reloaded = make_store(tmp_path)
+    assert reloaded.ids == ["1", "2", "3"]
+    assert reloaded.documents[1] == "saas mrr expansion"
+    assert reloaded.query(["saas mrr expansion"], n_results=1)[0][0]["id"] == "2"
+
+def test_cached_embedder_reuses_vectors(tmp_path):
+    embedder = CachedEmbedder(HashingEmbedder(), str(tmp_path / "cache.npz"))
+    embedder.embed(["revenue by region", "revenue by region"])
+    embedder.embed(["revenue by region"])
+    assert embedder.misses == 1
+    assert embedder.hits == 2
+
+    # Embedding (the query path) never writes; only flush does
+    assert not (tmp_path / "cache.npz").exists()
+    embedder.flush()
+
+    reloaded = CachedEmbedder(HashingEmbedder(), str(tmp_path / "cache.npz"))
+    reloaded.embed(["revenue by region"])
+    assert reloaded.misses == 0
+
+def test_switching_embedder_reembeds_instead_of_dropping_index(tmp_path):
+    store = NumpyVectorStore(HashingEmbedder(dim=64), str(tmp_path))
+    store.add(ids=["1", "2"], documents=["ecommerce sales", "saas churn"], metadatas=[{}, {}])
+
+    switched = NumpyVectorStore(HashingEmbedder(dim=128), str(tmp_path))
+    assert switched.ids == ["1", "2"]
+    assert switched.vectors.shape == (2, 128)
+
+    restored = NumpyVectorStore(HashingEmbedder(dim=64), str(tmp_path))
+    assert restored.query(["saas churn"], n_results=1)[0][0]["id"] == "2"
+
+def test_cached_embedder_is_bounded():
+    embedder = CachedEmbedder(HashingEmbedder(), max_entries=2)
+    embedder.embed(["a", "b"])
+    embedder.embed(["a"])
+    embedder.embed(["c"])
+    # "b" was least recently used
+    assert embedder.misses == 3
+    embedder.embed(["a", "c"])
+    assert embedder.misses == 3
+    embedder.embed(["b"])
+    assert embedder.misses == 4
+
+def test_mismatched_index_and_vectors_are_rebuilt(tmp_path):
+    store = make_store(tmp_path)
+    store.add(ids=["1", "2"], documents=["ecommerce sales", "saas churn"], metadatas=[{}, {}])
+
+    # Simulate a crash after vectors.npy was written but before index.json was
+    index = json.loads((tmp_path / "index.json").read_text())
+    index["ids"].append("3")
+    index["documents"].append("marketing spend")
+    index["metadatas"].append({})
+    (tmp_path / "index.json").write_text(json.dumps(index))
+
+    reloaded = make_store(tmp_path)
+    assert reloaded.vectors.shape[0] == 3
+    assert reloaded.query(["marketing spend"], n_results=1)[0][0]["id"] == "3"
+
+def test_metadata_index_tracks_replaced_documents_and_multi_key_filters(tmp_path):
+    from app.services.vector_store import _chroma_where
+
+    store = make_store(tmp_path)
+    store.add(
+        ids=["1", "2", "3"],
+        documents=["ecommerce sales", "ecommerce churn", "saas churn"],
+        metadatas=[{"team": "retail", "tier": 1}, {"team": "retail", "tier": 2}, {"team": "saas", "tier": 1}],
+    )
+    both = store.query(["churn"], n_results=3, where={"team": "retail", "tier": 2})
+    assert [r["id"] for r in both[0]] == ["2"]
+
+    # Replacing a document moves it out of its old postings
+    store.add(ids=["2"], documents=["ecommerce churn"], metadatas=[{"team": "saas", "tier": 2}])
+    assert store.query(["churn"], n_results=3, where={"team": "retail", "tier": 2}) == [[]]
+    assert sorted(r["id"] for r in store.query(["churn"], n_results=3, where={"team": "saas"})[0]) == ["2", "3"]
+
+    # The index is rebuilt on load
+    reloaded = make_store(tmp_path)
+    assert [r["id"] for r in reloaded.query(["sales"], n_results=3, where={"tier": 1, "team": "retail"})[0]] == ["1"]
+
+    assert _chroma_where({"team": "saas"}) == {"team": "saas"}
+    assert _chroma_where({"team": "saas", "tier": 1}) == {"$and": [{"team": "saas"}, {"tier": 1}]}
+    assert _chroma_where({}) is None
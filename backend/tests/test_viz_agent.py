@@ -17,3 +17,52 @@ def test_viz_agent_heuristics():
     # Rate -> Line
     assert specs[1].chart_type == "line"
     assert specs[1].title == "Conversion Rate Overview"
+
+def test_viz_agent_aggregates_and_breaks_down_by_dimension():
+    from app.services.rollup_service import RollupEngine
+    import pandas as pd
+
+    rows = [
+        {"date": "2024-01-01", "region": "EU", "revenue": 10},
+        {"date": "2024-01-01", "region": "US", "revenue": 20},
+        {"date": "2024-01-02", "region": "EU", "revenue": 5},
+    ]
+    rollups = RollupEngine().build(pd.DataFrame(rows))
+    specs = VisualizationAgent().run([], "dummy", rows, rollups)
+
+    assert len(specs) == 2
+    # Duplicate dates are collapsed with the spec's aggregation
+    assert specs[0].plotly_config["data"][0]["y"] == [30, 5]
+    assert specs[1].title == "Revenue by Region"
+    assert specs[1].plotly_config["data"][0]["x"] == ["EU", "US"]
+    assert specs[1].plotly_config["data"][0]["y"] == [15, 20]
+
+def test_viz_agent_averages_rate_columns_across_duplicate_dates():
+    rows = [
+        {"date": "2024-01-01", "region": "EU", "conversion_rate": 0.2},
+        {"date": "2024-01-01", "region": "US", "conversion_rate": 0.4},
+    ]
+    specs = VisualizationAgent().run([], "dummy", rows)
+
+    assert specs[0].aggregation == "mean"
+    assert specs[0].plotly_config["data"][0]["y"] == [pytest.approx(0.3)]
+
+def test_breakdown_charts_use_kpi_measure_and_skip_ids():
+    from app.services.rollup_service import RollupEngine
+    import pandas as pd
+
+    rows = [
+        {"customer_id": 101, "region": "EU", "active": "yes", "revenue": 10, "seats": 1},
+        {"customer_id": 102, "region": "US", "active": "no", "revenue": 20, "seats": 3},
+    ]
+    rollups = RollupEngine().build(pd.DataFrame(rows))
+    agent = VisualizationAgent()
+
+    # Without KPIs the first non-id measure is charted
+    titles = [s.title for s in agent.run([], "dummy", rows, rollups) if " by " in s.title]
+    assert titles == ["Revenue by Region", "Revenue by Active"]
+
+    # A measure referenced by an extracted KPI wins
+    kpis = [{"name": "Seats Sold", "formula": "df['seats'].sum()"}]
+    titles = [s.title for s in agent.run(kpis, "dummy", rows, rollups) if " by " in s.title]
+    assert titles == ["Seats by Region", "Seats by Active"]